@@ -1,10 +1,28 @@
 from pathlib import Path
-import json, re, csv
+import os, json, re, csv, pickle
 from io import StringIO
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 import streamlit as st
 
+# Optional: faster JSON (de)serialization
+try:
+    import orjson
+    _loads = orjson.loads
+    def _dumps_pretty(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except Exception:
+    _loads = json.loads
+    def _dumps_pretty(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
+# Optional: fuzzy search fallback
+try:
+    from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+    RF_READY = True
+except Exception:
+    RF_READY = False
+
 # Optional: Google Sheets logging
 try:
     import gspread
@@ -16,23 +34,97 @@ except Exception:
 # ---------- Settings ----------
 TIMEZONE = ZoneInfo("Asia/Kolkata")
 DATA_DIR = Path(__file__).parent / "data" / "algorithms"
+CACHE_DIR = Path.home() / ".cache" / "icu-assistant"
+LOG_HEADERS = ["timestamp_ist","timestamp_utc","node_id","node_text","choice","next_node"]
+
+_RE_SUFFIX = re.compile(r"\.(final|fixed|clean|polished|v\d+)+$", re.I)
+_RE_LEADING_NUM = re.compile(r"^\d+_")
 
 st.set_page_config(page_title="ICU Assistant", layout="wide")
 st.caption("build: 2025-10-24 21:10 IST")
 
 # ---------- Helpers ----------
+def _walk_json(root: Path, dir_mtimes: dict | None = None):
+    # scandir reuses d_type from the directory listing, so most entries need no stat()
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        if dir_mtimes is not None:
+            dir_mtimes[d] = os.stat(d).st_mtime_ns  # taken before listing, so a racing edit invalidates
+        with os.scandir(d) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.name.endswith(".json") and e.is_file(follow_symlinks=False):
+                    yield Path(e.path)
+
 @st.cache_data(show_spinner=False)
 def list_files():
-    return sorted(p for p in DATA_DIR.rglob("*.json") if p.is_file())
+    # cold starts reuse the last walk while no directory in it has changed; adding or
+    # removing an entry bumps its parent's mtime, so one stat() per directory suffices
+    if not DATA_DIR.is_dir():
+        return []
+    cache = CACHE_DIR / "filelist.pkl"
+    try:
+        root, dir_mtimes, files = pickle.loads(cache.read_bytes())
+        if root == str(DATA_DIR) and all(os.stat(d).st_mtime_ns == m for d, m in dir_mtimes.items()):
+            return files
+    except Exception:
+        pass  # missing/corrupt cache or a directory that's gone: walk again
+    dir_mtimes = {}
+    files = sorted(_walk_json(DATA_DIR, dir_mtimes))
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cache.write_bytes(pickle.dumps((str(DATA_DIR), dir_mtimes, files)))
+    except OSError:
+        pass  # read-only home: just skip persisting
+    return files
+
+@st.cache_resource(show_spinner=False)
+def file_index():
+    # files and their casefolded names live in one entry, so they can't drift apart
+    files = list_files()
+    return files, [p.name.casefold() for p in files]
+
+def filter_files(files: list, names: list[str], q: str) -> list:
+    qf = q.casefold()
+    view = [p for p, n in zip(files, names) if qf in n]
+    if len(view) == len(files):
+        return files  # everything matched: hand back the same options list
+    if not view and RF_READY:
+        # no exact hit (likely a typo): fall back to ranked fuzzy matches
+        hits = rf_process.extract(qf, names, scorer=rf_fuzz.partial_ratio, limit=50, score_cutoff=60)
+        view = [files[i] for _, _, i in hits]
+    return view
 
 @st.cache_data(show_spinner=False)
 def load_json(p: Path):
-    return json.loads(p.read_text(encoding="utf-8"))
+    return _loads(p.read_bytes())
+
+@st.cache_resource(show_spinner=False)
+def all_flows():
+    # parsed once per process and shared by reference; callers must not mutate
+    out = {}
+    for p in list_files():
+        try:
+            out[str(p)] = _loads(p.read_bytes())
+        except Exception:
+            pass  # left to load_json so the guide screen can show the parse error
+    return out
+
+def flow_data(p: Path):
+    flows = all_flows()
+    return flows[str(p)] if str(p) in flows else load_json(p)
 
 def pretty(p: Path) -> str:
-    n = re.sub(r"\.json$", "", p.name, flags=re.I)
-    n = re.sub(r"\.(final|fixed|clean|polished|v\d+)+$", "", n, flags=re.I)
-    return re.sub(r"^\d+_", "", n).replace("_", " ")
+    name = p.name
+    n = name[:-5] if name[-5:].lower() == ".json" else name
+    # every suffix tag starts with "." and the prefix with a digit; skip the regex otherwise
+    if "." in n:
+        n = _RE_SUFFIX.sub("", n)
+    if n[:1].isdigit():
+        n = _RE_LEADING_NUM.sub("", n)
+    return n.replace("_", " ")
 
 def go_home():
     st.session_state.clear()
@@ -47,9 +139,10 @@ def start_case(issue_path: Path, resident: str, patient_id: str):
     st.session_state["orders_cart"] = []    # list[str]
 
 def log_step(node_id: str, node_text: str, action_label: str, next_id: str):
+    now_utc = datetime.now(timezone.utc)
     st.session_state["log"].append({
-        "timestamp_ist": datetime.now(TIMEZONE).isoformat(timespec="seconds"),
-        "timestamp_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "timestamp_ist": now_utc.astimezone(TIMEZONE).isoformat(timespec="seconds"),
+        "timestamp_utc": now_utc.isoformat(timespec="seconds"),
         "node_id": node_id,
         "node_text": node_text,
         "choice": action_label,
@@ -58,10 +151,9 @@ def log_step(node_id: str, node_text: str, action_label: str, next_id: str):
 
 def csv_from_rows(rows: list, headers: list):
     s = StringIO()
-    w = csv.DictWriter(s, fieldnames=headers)
-    w.writeheader()
-    for r in rows:
-        w.writerow({k: r.get(k, "") for k in headers})
+    w = csv.writer(s)
+    w.writerow(headers)
+    w.writerows([r.get(h, "") for h in headers] for r in rows)
     return s.getvalue()
 
 def nodes_table_from_flow(flow: dict):
@@ -71,37 +163,74 @@ def nodes_table_from_flow(flow: dict):
         out.append({"id": n.get("id",""), "end": bool(n.get("end", False)), "text": n.get("text",""), "options": opts})
     return out
 
+@st.cache_data(show_spinner=False)
+def nodes_table_for(issue_path: str):
+    return nodes_table_from_flow(flow_data(Path(issue_path))["assistant_flow"])
+
+@st.cache_data(show_spinner=False)
+def _nodes_arrow(issue_path: str):
+    import pyarrow as pa  # ships with streamlit
+    # hand-authored JSON can mix types within a column (int/str ids, list text);
+    # stringify everything but the bool flag so from_pylist can't raise ArrowTypeError
+    rows = [{k: v if isinstance(v, bool) else ("" if v is None else str(v)) for k, v in r.items()}
+            for r in nodes_table_for(issue_path)]
+    return pa.Table.from_pylist(rows)
+
+@st.cache_resource(show_spinner=False)
+def nodes_index(issue_path: str):
+    # cache_resource returns the stored dict itself (shared, read-only); cache_data would unpickle a copy per rerun
+    flow = flow_data(Path(issue_path))["assistant_flow"]
+    nodes = {n["id"]: n for n in flow.get("nodes", []) if isinstance(n, dict) and "id" in n}
+    return nodes, flow.get("start")
+
 # ---------- Google Sheets ----------
-def _gs_client():
+def _gs_settings():
+    # read on every save (not cached), so Secrets added later take effect
     if not GS_READY:
-        return None, None
+        return None
     sa_json = st.secrets.get("GSHEETS_SA_JSON", None)
     sheet_url = st.secrets.get("GSHEET_URL", None)
     if not sa_json or not sheet_url:
-        return None, None
+        return None
+    return sa_json, sheet_url
+
+@st.cache_resource(show_spinner=False)
+def _gs_spreadsheet(sa_json: str, sheet_url: str):
     creds = Credentials.from_service_account_info(
         json.loads(sa_json),
         scopes=["https://www.googleapis.com/auth/spreadsheets",
                 "https://www.googleapis.com/auth/drive"]
     )
     gc = gspread.authorize(creds)
-    return gc, sheet_url
+    return gc.open_by_url(sheet_url)
+
+@st.cache_resource(show_spinner=False)
+def _gs_worksheet(sa_json: str, sheet_url: str, title: str, header: tuple, cols: int):
+    # looked up (or created) once per process; saves then only pay for append_rows
+    sh = _gs_spreadsheet(sa_json, sheet_url)
+    try:
+        return sh.worksheet(title)
+    except Exception:
+        ws = sh.add_worksheet(title=title, rows=1000, cols=cols)
+        ws.append_row(list(header))
+        return ws
+
+def _gs_append(settings: tuple, title: str, header: tuple, cols: int, rows: list):
+    ws = _gs_worksheet(*settings, title, header, cols)
+    try:
+        ws.append_rows(rows, value_input_option="RAW")
+    except Exception:
+        # the cached handle may point at a deleted/renamed sheet; look it up again next save
+        _gs_worksheet.clear()
+        raise
 
 def save_to_gsheet(meta: dict, orders: list[str]):
-    gc, sheet_url = _gs_client()
-    if not gc:
+    settings = _gs_settings()
+    if not settings:
         st.warning("Google Sheets not configured in Secrets.")
         return False
 
-    sh = gc.open_by_url(sheet_url)
-
     # transcripts sheet (one row per step)
-    try:
-        ws_t = sh.worksheet("transcripts")
-    except Exception:
-        ws_t = sh.add_worksheet(title="transcripts", rows=1000, cols=12)
-        ws_t.append_row(["case_id","issue","resident","patient_id",
-                         "timestamp_ist","timestamp_utc","node_id","node_text","choice","next_node"])
     t_rows = []
     for r in meta["log"]:
         t_rows.append([
@@ -117,15 +246,11 @@ def save_to_gsheet(meta: dict, orders: list[str]):
             r.get("next_node",""),
         ])
     if t_rows:
-        ws_t.append_rows(t_rows, value_input_option="RAW")
+        _gs_append(settings, "transcripts", ("case_id","issue","resident","patient_id",
+                   "timestamp_ist","timestamp_utc","node_id","node_text","choice","next_node"), 12, t_rows)
 
     # orders sheet (one row per unique order)
     if orders:
-        try:
-            ws_o = sh.worksheet("orders")
-        except Exception:
-            ws_o = sh.add_worksheet(title="orders", rows=1000, cols=8)
-            ws_o.append_row(["case_id","issue","resident","patient_id","order"])
         o_rows = []
         for od in orders:
             o_rows.append([
@@ -135,23 +260,24 @@ def save_to_gsheet(meta: dict, orders: list[str]):
                 meta.get("patient_id",""),
                 od
             ])
-        ws_o.append_rows(o_rows, value_input_option="RAW")
+        _gs_append(settings, "orders", ("case_id","issue","resident","patient_id","order"), 8, o_rows)
 
     return True
 
 # ---------- App ----------
-files = list_files()
+files, names_cf = file_index()
 if not files:
     st.error(f"No JSONs under {DATA_DIR}"); st.stop()
 
 if st.button("Reload files"):
-    st.cache_data.clear(); st.rerun()
+    (CACHE_DIR / "filelist.pkl").unlink(missing_ok=True)
+    st.cache_data.clear(); all_flows.clear(); file_index.clear(); nodes_index.clear(); st.rerun()
 
 # Home screen
 if "issue_path" not in st.session_state:
     st.title("ICU Assistant")
     q = st.text_input("search issues")
-    view = [p for p in files if (q.lower() in p.name.lower())] if q else files
+    view = filter_files(files, names_cf, q) if q else files
     choice = st.selectbox("select issue", view, index=0, format_func=pretty)
 
     c1, c2 = st.columns(2)
@@ -166,12 +292,18 @@ if "issue_path" not in st.session_state:
     st.stop()
 
 # Guide screen
-issue = Path(st.session_state["issue_path"])
+ss = st.session_state
+issue_path = ss["issue_path"]
+log = ss.setdefault("log", [])
+case_id = ss.get("case_id", "")
+resident = ss.get("resident", "")
+patient_id = ss.get("patient_id", "")
+issue = Path(issue_path)
 st.button("← back", on_click=go_home)
 st.header(pretty(issue))
 
 try:
-    data = load_json(issue)
+    data = flow_data(issue)
 except Exception as e:
     st.error(f"JSON load/parse error: {e}")
     st.code(issue.read_text(encoding="utf-8"), language="json")
@@ -183,16 +315,14 @@ if not flow:
     st.json(data, expanded=False)
     st.stop()
 
-nodes = {n["id"]: n for n in flow.get("nodes", []) if isinstance(n, dict) and "id" in n}
-start = flow.get("start")
+nodes, start = nodes_index(issue_path)
 if not nodes or not start:
     st.warning("assistant_flow missing start/nodes")
     st.json(flow); st.stop()
 
-if "node_id" not in st.session_state or st.session_state["node_id"] is None:
-    st.session_state["node_id"] = start
-
-nid = st.session_state["node_id"]
+nid = ss.get("node_id")
+if nid is None:
+    nid = ss["node_id"] = start
 node = nodes.get(nid, {})
 
 # Step text
@@ -205,11 +335,10 @@ if orders:
     for o in orders:
         st.markdown(f"• {o}")
     if st.button("Add these to case orders"):
-        cart = st.session_state.get("orders_cart", [])
+        cart = ss.setdefault("orders_cart", [])
         for o in orders:
             if o not in cart:
                 cart.append(o)
-        st.session_state["orders_cart"] = cart
 
 # Options
 if node.get("end"):
@@ -219,37 +348,43 @@ else:
         lbl, nxt = opt.get("label", "Next"), opt.get("next")
         if st.button(lbl, key=f"{nid}_{lbl}"):
             log_step(nid, node.get("text",""), lbl, nxt)
-            st.session_state["node_id"] = nxt
+            ss["node_id"] = nxt
             st.rerun()
 
 st.divider()
 
 # Reference: nodes table
 with st.expander("nodes (reference)", expanded=False):
-    tbl = nodes_table_from_flow(flow)
-    st.table(tbl)
+    tbl = nodes_table_for(str(issue))
+    st.dataframe(_nodes_arrow(str(issue)), width="stretch")
     nodes_csv = csv_from_rows(tbl, ["id","end","text","options"])
     st.download_button("download nodes (csv)", data=nodes_csv,
                        file_name=f"{issue.stem}_nodes.csv", mime="text/csv")
 
 # Transcript + save/export
 with st.expander("transcript (choices made)", expanded=True):
-    log = st.session_state.get("log", [])
     if not log:
         st.write("no choices yet")
     else:
-        for i, r in enumerate(log, 1):
-            st.write(f"{i}. [{r['timestamp_ist']}] at {r['node_id']} → “{r['choice']}”")
+        # one markdown element for the whole list instead of one per step
+        st.markdown("\n".join(f"{i}. [{r['timestamp_ist']}] at `{r['node_id']}` → “{r['choice']}”"
+                               for i, r in enumerate(log, 1)))
 
     meta = {
-        "case_id": st.session_state.get("case_id",""),
+        "case_id": case_id,
         "issue": pretty(issue),
-        "resident": st.session_state.get("resident",""),
-        "patient_id": st.session_state.get("patient_id",""),
+        "resident": resident,
+        "patient_id": patient_id,
         "log": log
     }
-    json_blob = json.dumps(meta, ensure_ascii=False, indent=2)
-    csv_blob = csv_from_rows(log, ["timestamp_ist","timestamp_utc","node_id","node_text","choice","next_node"])
+    # per-session memo: log is only appended to or replaced, so id+len identify its contents
+    blobs_key = (id(log), len(log), case_id, issue_path, resident, patient_id)
+    cached = ss.get("_export_blobs")
+    if cached and cached[0] == blobs_key:
+        json_blob, csv_blob = cached[1]
+    else:
+        json_blob, csv_blob = _dumps_pretty(meta), csv_from_rows(log, LOG_HEADERS)
+        ss["_export_blobs"] = (blobs_key, (json_blob, csv_blob))
     c1, c2, c3 = st.columns(3)
     with c1:
         st.download_button("download transcript (json)", data=json_blob,
@@ -259,7 +394,7 @@ with st.expander("transcript (choices made)", expanded=True):
                            file_name=f"{meta['case_id'] or 'case'}.csv", mime="text/csv")
     with c3:
         if GS_READY and st.button("save to google sheet"):
-            ok = save_to_gsheet(meta, st.session_state.get("orders_cart", []))
+            ok = save_to_gsheet(meta, ss.get("orders_cart", []))
             if ok: st.success("saved to Google Sheet")
         elif not GS_READY:
             st.caption("install gspread + google-auth to enable Google Sheets save.")
@@ -268,22 +403,22 @@ with st.expander("transcript (choices made)", expanded=True):
 
 # Case orders review/export
 with st.expander("case orders", expanded=False):
-    cart = st.session_state.get("orders_cart", [])
+    cart = ss.get("orders_cart", [])
     if not cart:
         st.write("no orders yet")
     else:
         txt = "\n".join(f"- {o}" for o in cart)
         st.code(txt)
         st.download_button("download orders (.txt)", data=txt,
-                           file_name=f"{st.session_state.get('case_id','case')}_orders.txt")
+                           file_name=f"{case_id or 'case'}_orders.txt")
 
 # Footer controls
 c1, c2 = st.columns(2)
 with c1:
     if st.button("restart case"):
-        st.session_state["node_id"] = start
-        st.session_state["log"] = []
-        st.session_state["orders_cart"] = []
+        ss["node_id"] = start
+        ss["log"] = []
+        ss["orders_cart"] = []
         st.rerun()
 with c2:
     if st.button("new case"):